@@ -1,85 +1,159 @@
-import json  # Importing JSON module to handle JSON file operations
 import os  # Importing OS module to interact with the operating system, like checking file existence
-import random  # Importing Random module to generate random numbers
+import secrets  # Importing Secrets module for cryptographically strong random numbers
 import base64  # Importing Base64 module to encode and decode data
+import mmap  # Importing mmap to map the data file into memory without an extra copy
+import functools  # Importing functools for the decryption result cache
+import threading  # Importing threading to flush the journal in the background
+from concurrent.futures import ThreadPoolExecutor  # Importing a thread pool to decrypt accounts in parallel at startup
+import struct  # Importing struct to pack transaction rows into a fixed binary layout
+import time  # Importing time for cheap epoch timestamps
 from datetime import datetime  # Importing Datetime to handle date and time
-from cryptography.fernet import Fernet, InvalidToken  # Importing Fernet for encryption and InvalidToken for handling decryption errors
+from cryptography.exceptions import InvalidTag  # Importing InvalidTag for handling decryption errors
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # Importing AES-GCM, which uses hardware AES instructions where available
+import cbor2  # Importing CBOR for compact binary storage that holds ciphertext bytes without base64
+
+# Transaction action codes and their display labels
+ACTION_DEPOSIT = 0
+ACTION_WITHDRAW = 1
+ACTION_TRANSFER_OUT = 2
+ACTION_TRANSFER_IN = 3
+ACTION_LABELS = ("Deposit", "Withdraw", "Transfer to", "Transfer from")
+
+# Fixed binary layout of one transaction row:
+# action code (uint8), amount (float64), epoch seconds (int64), counterparty account (uint32, 0 if none)
+# Precompiled Struct objects parse the format string once at import; the bound
+# pack/unpack methods then run without any per-call format interpretation
+TX_STRUCT = struct.Struct('<BdqI')
+LEN_PREFIX = struct.Struct('<I')  # Chunk length prefix used by the bulk encryption buffer
 
 # Class to manage encryption and decryption processes
 class EncryptionManager:
+    NONCE_SIZE = 12  # AES-GCM nonce size in bytes, prepended to every ciphertext
+
     def __init__(self, key_file='secret.key'):
         self.key_file = key_file  # Setting the file where the encryption key will be stored
         self.key = self.load_or_generate_key()  # Load an existing key or generate a new one
+        self._aead = AESGCM(self.key)  # Parse the key once and reuse the cipher for every encrypt/decrypt call
+        # Cache decrypted values per ciphertext so repeated reads (e.g. receipt views)
+        # skip the AES work entirely; bound per instance to keep lru_cache off `self`
+        self.decrypt_bytes = functools.lru_cache(maxsize=4096)(self._decrypt_bytes)
+        self._aead.encrypt(bytes(self.NONCE_SIZE), b'', None)  # Warm the cipher so first use pays no one-time setup
 
     # Load the key from file if it exists, otherwise generate a new key
     def load_or_generate_key(self):
         if os.path.exists(self.key_file):  # Check if the key file exists
             with open(self.key_file, 'rb') as file:  # Open the key file in binary read mode
-                return file.read()  # Return the key
+                key = file.read()
+            if len(key) != 32:  # Migrate an old base64-encoded Fernet key to its raw 32 bytes
+                key = base64.urlsafe_b64decode(key)
+                with open(self.key_file, 'wb') as file:
+                    file.write(key)
+            return key  # Return the key
         else:
-            key = Fernet.generate_key()  # Generate a new encryption key
+            key = AESGCM.generate_key(bit_length=256)  # Generate a new 32-byte encryption key
             with open(self.key_file, 'wb') as file:  # Open the key file in binary write mode
                 file.write(key)  # Write the key to the file
             return key  # Return the newly generated key
 
-    # Encrypt the provided data using the encryption key
+    # Encrypt raw bytes using the cached cipher; returns nonce + ciphertext as raw bytes
+    def encrypt_bytes(self, data):
+        nonce = os.urandom(self.NONCE_SIZE)  # Fresh random nonce for every ciphertext
+        return nonce + self._aead.encrypt(nonce, data, None)
+
+    # Encrypt the provided string
     def encrypt(self, data):
-        f = Fernet(self.key)  # Initialize Fernet with the encryption key
-        encrypted_data = f.encrypt(data.encode())  # Encrypt the data (converted to bytes)
-        return base64.urlsafe_b64encode(encrypted_data).decode('utf-8')  # Encode the encrypted bytes to a URL-safe string for JSON storage
+        return self.encrypt_bytes(data.encode())
 
-    # Decrypt the provided encrypted data
-    def decrypt(self, data):
-        f = Fernet(self.key)  # Initialize Fernet with the encryption key
+    # Decrypt to raw bytes (wrapped by an LRU cache in __init__)
+    def _decrypt_bytes(self, data):
         try:
-            encrypted_data = base64.urlsafe_b64decode(data)  # Decode the URL-safe string back to bytes
-            return f.decrypt(encrypted_data).decode()  # Decrypt the data and convert it back to a string
-        except InvalidToken:
+            nonce, ciphertext = data[:self.NONCE_SIZE], data[self.NONCE_SIZE:]
+            return self._aead.decrypt(nonce, ciphertext, None)  # Decrypt the data
+        except (InvalidTag, ValueError):
             print("Warning: Could not decrypt data. Skipping.")  # Handle cases where decryption fails
             return None
 
+    # Decrypt the provided encrypted data back to a string
+    def decrypt(self, data):
+        raw = self.decrypt_bytes(data)
+        return raw.decode() if raw is not None else None
+
+    # Encrypt several byte chunks as one length-prefixed buffer with a single cipher call,
+    # letting OpenSSL run its bulk AES path instead of paying per-call setup per field
+    def encrypt_bulk(self, chunks):
+        buffer = b''.join(LEN_PREFIX.pack(len(chunk)) + chunk for chunk in chunks)
+        return self.encrypt_bytes(buffer)
+
+    # Decrypt a bulk token back into its list of byte chunks
+    def decrypt_bulk(self, data):
+        buffer = self.decrypt_bytes(data)
+        if buffer is None:
+            return None
+        chunks = []
+        offset = 0
+        while offset < len(buffer):
+            (length,) = LEN_PREFIX.unpack_from(buffer, offset)
+            offset += 4
+            chunks.append(buffer[offset:offset + length])
+            offset += length
+        return chunks
+
 # Class representing a bank account
 class BankAccount:
-    def __init__(self, account_number, account_holder, balance=0.0, transactions=None, encryption_manager=None):
+    def __init__(self, account_number, account_holder, balance=0.0, encryption_manager=None):
         self.account_number = account_number  # Store the account number
         self.encryption_manager = encryption_manager  # Store the encryption manager
 
-        # Encrypt account holder's name and balance
-        self.encrypted_account_holder = self.encryption_manager.encrypt(account_holder)
-        self.encrypted_balance = self.encryption_manager.encrypt(str(balance))
+        # Keep the account holder's name and balance as cleartext in memory;
+        # they are only encrypted when the account is written to disk
+        self.account_holder = account_holder
+        self.balance = balance
+
+        # Transactions as parallel arrays of scalars (struct-of-arrays) instead of
+        # a list of per-record dicts: far less memory and no JSON per record
+        self.tx_actions = []  # Action codes (ACTION_*)
+        self.tx_amounts = []  # Amounts as floats
+        self.tx_times = []  # Epoch seconds as ints
+        self.tx_refs = []  # Counterparty account numbers for transfers, 0 otherwise
+        self._pending_tx = []  # Encrypted packed rows added since the last journal write
 
-        self.transactions = transactions if transactions is not None else []  # Initialize transactions list
+    # Number of transactions recorded on this account
+    def transaction_count(self):
+        return len(self.tx_actions)
 
-    # Decrypt and return the account holder's name
-    @property
-    def account_holder(self):
-        return self.encryption_manager.decrypt(self.encrypted_account_holder)
+    # Append one already-unpacked transaction row to the parallel arrays
+    def append_tx_row(self, action, amount, timestamp, ref):
+        self.tx_actions.append(action)
+        self.tx_amounts.append(amount)
+        self.tx_times.append(timestamp)
+        self.tx_refs.append(ref)
 
-    # Decrypt and return the balance as a float
-    @property
-    def balance(self):
-        return float(self.encryption_manager.decrypt(self.encrypted_balance))
+    # Pack the full transaction history into one binary blob for persistence
+    def pack_transactions(self):
+        return b''.join(TX_STRUCT.pack(a, m, t, r)
+                        for a, m, t, r in zip(self.tx_actions, self.tx_amounts, self.tx_times, self.tx_refs))
 
-    # Update the balance by encrypting the new balance value
+    # Unpack a binary blob of transaction rows into the parallel arrays
+    def unpack_transactions(self, blob):
+        for row in TX_STRUCT.iter_unpack(blob):
+            self.append_tx_row(*row)
+
+    # Update the in-memory balance; encryption happens at save time
     def update_balance(self, new_balance):
-        self.encrypted_balance = self.encryption_manager.encrypt(str(new_balance))
-
-    # Add a transaction record after encrypting it
-    def add_transaction(self, action, amount):
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # Record the current date and time
-        transaction_record = {
-            "action": action,
-            "amount": amount,
-            "date_time": timestamp
-        }
-        encrypted_record = self.encryption_manager.encrypt(json.dumps(transaction_record))  # Encrypt the transaction record
-        self.transactions.append(encrypted_record)  # Add the encrypted record to the transactions list
+        self.balance = new_balance
+
+    # Record a transaction as packed scalars; `ref` is the counterparty account for transfers
+    def add_transaction(self, action, amount, ref=0):
+        timestamp = int(time.time())  # Epoch seconds; formatted only when displayed
+        self.append_tx_row(action, amount, timestamp, ref)
+        packed_row = TX_STRUCT.pack(action, amount, timestamp, ref)
+        self._pending_tx.append(self.encryption_manager.encrypt_bytes(packed_row))  # Remember it for the next journal write
 
     # Method to deposit money into the account
     def deposit(self, amount):
         new_balance = self.balance + amount  # Calculate the new balance
         self.update_balance(new_balance)  # Update the balance
-        self.add_transaction("Deposit", amount)  # Add the deposit transaction
+        self.add_transaction(ACTION_DEPOSIT, amount)  # Add the deposit transaction
         print(f"{amount} has been deposited. New balance: {new_balance}")
 
     # Method to withdraw money from the account
@@ -89,7 +163,7 @@ class BankAccount:
         else:
             new_balance = self.balance - amount  # Calculate the new balance
             self.update_balance(new_balance)  # Update the balance
-            self.add_transaction("Withdraw", amount)  # Add the withdrawal transaction
+            self.add_transaction(ACTION_WITHDRAW, amount)  # Add the withdrawal transaction
             print(f"{amount} has been withdrawn. New balance: {new_balance}")
 
     # Method to transfer money from this account to another
@@ -101,8 +175,8 @@ class BankAccount:
             target_new_balance = target_account.balance + amount  # Calculate the new balance of the target account
             self.update_balance(new_balance)  # Update this account's balance
             target_account.update_balance(target_new_balance)  # Update the target account's balance
-            self.add_transaction(f"Transfer to {target_account.account_number}", amount)  # Add the transfer transaction to this account
-            target_account.add_transaction(f"Transfer from {self.account_number}", amount)  # Add the transfer transaction to the target account
+            self.add_transaction(ACTION_TRANSFER_OUT, amount, int(target_account.account_number))  # Add the transfer transaction to this account
+            target_account.add_transaction(ACTION_TRANSFER_IN, amount, int(self.account_number))  # Add the transfer transaction to the target account
             print(f"Transferred {amount} to account {target_account.account_number}. New balance: {new_balance}")
 
     # Method to print the transaction receipt
@@ -113,59 +187,154 @@ class BankAccount:
         print(f"Account Number: {self.account_number}")
         print(f"Balance: {self.balance}")
         print("Recent Transactions:")
-        for encrypted_transaction in self.transactions[-5:]:  # Only show the last 5 transactions
-            transaction_json = self.encryption_manager.decrypt(encrypted_transaction)  # Decrypt the transaction record
-            if transaction_json:
-                transaction = json.loads(transaction_json)  # Convert the decrypted JSON string back to a dictionary
-                print(f"- {transaction['date_time']}: {transaction['action']} {transaction['amount']}")
+        for i in range(max(0, self.transaction_count() - 5), self.transaction_count()):  # Only show the last 5 transactions
+            label = ACTION_LABELS[self.tx_actions[i]]
+            if self.tx_refs[i]:  # Transfers name their counterparty account
+                label = f"{label} {self.tx_refs[i]}"
+            date_time = datetime.fromtimestamp(self.tx_times[i]).isoformat(' ', 'seconds')  # Cheaper than strftime, same output
+            print(f"- {date_time}: {label} {self.tx_amounts[i]}")
         print("-------------------\n")
 
 # Class representing the overall bank system
 class BankSystem:
-    def __init__(self, data_file='bank_data.json'):
+    def __init__(self, data_file='bank_data.cbor'):
         self.data_file = data_file  # Set the file to store account data
+        self.journal_file = data_file + '.log'  # Append-only journal of changes since the last snapshot
         self.encryption_manager = EncryptionManager()  # Initialize the encryption manager
+        self._snapshot_cache = {}  # Ready-to-write snapshot token per unchanged account
         self.accounts = self.load_accounts()  # Load accounts from the data file
+        self._journal = open(self.journal_file, 'ab')  # Keep the journal open for cheap appends
+        self._dirty = False  # Set when journal records are buffered but not yet flushed
+        self._stop_flush = threading.Event()  # Signals the background flusher to stop
+        self._flusher = threading.Thread(target=self.flush_loop, daemon=True)  # Flush to disk during user think-time
+        self._flusher.start()
+
+    # Background loop that flushes buffered journal records every couple of seconds
+    def flush_loop(self):
+        while not self._stop_flush.wait(2.0):  # Wakes every 2 seconds, exits promptly on stop
+            if self._dirty:
+                self._dirty = False
+                self._journal.flush()
 
     # Load accounts from the JSON data file, decrypting them as necessary
     def load_accounts(self):
+        accounts = {}
         if os.path.exists(self.data_file):  # Check if the data file exists
-            with open(self.data_file, 'r') as f:  # Open the data file in read mode
+            with open(self.data_file, 'rb') as f:  # Open the data file in binary read mode
                 try:
-                    data = json.load(f)  # Load the JSON data
-                    accounts = {}
-                    for acc_num, details in data.items():
-                        accounts[acc_num] = BankAccount(
-                            account_number=acc_num,
-                            account_holder=self.encryption_manager.decrypt(details['account_holder']),
-                            balance=float(self.encryption_manager.decrypt(details['balance'])),
-                            transactions=details.get('transactions', []),
-                            encryption_manager=self.encryption_manager
-                        )
-                    return accounts
-                except json.JSONDecodeError:
-                    print("Error: Could not decode JSON data. The file might be corrupted.")
+                    # Memory-map the file so the parser reads the kernel's pages directly,
+                    # avoiding a separate in-memory copy of the whole file
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        data = cbor2.loads(view)  # Load the CBOR data
+                    # Decrypt accounts across all cores: the cipher releases the GIL
+                    # inside OpenSSL, so the AES work genuinely runs in parallel
+                    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                        for result in executor.map(self.decrypt_account, data.items()):
+                            if result is None:
+                                continue
+                            acc_num, account, record = result
+                            accounts[acc_num] = account
+                            self._snapshot_cache[acc_num] = record  # Still valid unless the journal touches this account
+                except (cbor2.CBORDecodeError, ValueError):
+                    print("Error: Could not decode the data file. It might be corrupted.")
                     return {}
-        return {}
+        self.replay_journal(accounts)  # Apply changes recorded after the snapshot was written
+        return accounts
+
+    # Decrypt one snapshot record into a BankAccount; runs on a pool thread during load
+    def decrypt_account(self, item):
+        acc_num, record = item
+        chunks = self.encryption_manager.decrypt_bulk(record)  # holder, balance and packed history in one blob
+        if chunks is None:
+            return None
+        account = BankAccount(
+            account_number=acc_num,
+            account_holder=chunks[0].decode(),
+            balance=float(chunks[1]),
+            encryption_manager=self.encryption_manager
+        )
+        account.unpack_transactions(chunks[2])
+        return acc_num, account, record
+
+    # Replay the journal on top of the loaded snapshot
+    def replay_journal(self, accounts):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'rb') as f:
+            while True:  # The journal is a sequence of CBOR records
+                try:
+                    record = cbor2.load(f)
+                except cbor2.CBORDecodeEOF:  # End of journal, or a torn tail write from a crash
+                    break
+                except cbor2.CBORDecodeError:
+                    print("Warning: Skipping the rest of a corrupted journal.")
+                    break
+                self._snapshot_cache.pop(record['acc'], None)  # This account changed after the snapshot
+                account = accounts.get(record['acc'])
+                if account is None:  # A record for an account created after the snapshot
+                    account = BankAccount(
+                        account_number=record['acc'],
+                        account_holder=self.encryption_manager.decrypt(record['holder']),
+                        balance=float(self.encryption_manager.decrypt(record['bal'])),
+                        encryption_manager=self.encryption_manager
+                    )
+                    accounts[record['acc']] = account
+                else:
+                    account.balance = float(self.encryption_manager.decrypt(record['bal']))
+                for encrypted_row in record.get('tx', ()):  # Each journal entry carries one packed row
+                    row = self.encryption_manager.decrypt_bytes(encrypted_row)
+                    if row is not None:
+                        account.unpack_transactions(row)
+
+    # Append the changed accounts to the journal instead of rewriting the whole data file
+    def log_change(self, *changed_accounts):
+        for acc in changed_accounts:
+            record = {
+                "acc": acc.account_number,
+                "holder": self.encryption_manager.encrypt(acc.account_holder),
+                "bal": self.encryption_manager.encrypt(str(acc.balance)),
+                "tx": acc._pending_tx
+            }
+            self._journal.write(cbor2.dumps(record))
+            acc._pending_tx = []
+            self._snapshot_cache.pop(acc.account_number, None)  # The cached snapshot token is now stale
+        self._dirty = True  # The background flusher will push this to disk shortly
+
+    # Rewrite the snapshot from the in-memory accounts and truncate the journal
+    def compact(self):
+        self.save_accounts()
+        self._journal.truncate(0)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
 
     # Save the account details back to the JSON data file, encrypting them before saving
     def save_accounts(self):
-        data = {acc_num: {
-                    "account_holder": acc.encrypted_account_holder,
-                    "balance": acc.encrypted_balance,
-                    "transactions": acc.transactions
-                }
-                for acc_num, acc in self.accounts.items()}
-        with open(self.data_file, 'w') as f:  # Open the data file in write mode
-            json.dump(data, f, indent=4)  # Save the JSON data with indentation for readability
+        # Holder, balance and the packed transaction history are encrypted together
+        # as one blob per account; unchanged accounts reuse their cached token
+        # instead of being packed and encrypted again on every save
+        data = {}
+        for acc_num, acc in self.accounts.items():
+            token = self._snapshot_cache.get(acc_num)
+            if token is None:
+                token = self.encryption_manager.encrypt_bulk([
+                    acc.account_holder.encode(),
+                    str(acc.balance).encode(),
+                    acc.pack_transactions()
+                ])
+                self._snapshot_cache[acc_num] = token
+            data[acc_num] = token
+        with open(self.data_file, 'wb') as f:  # Open the data file in binary write mode
+            cbor2.dump(data, f)  # Binary CBOR: length-prefixed ciphertext bytes, no base64 or JSON escaping
 
     # Create a new bank account
     def create_account(self, account_holder):
-        account_number = str(random.randint(10000000, 99999999))  # Generate a random 8-digit account number
-        while account_number in self.accounts:  # Ensure the account number is unique
-            account_number = str(random.randint(10000000, 99999999))
+        # Draw one unpredictable 8-digit number, then probe linearly on the rare collision
+        number = 10_000_000 + secrets.randbelow(90_000_000)
+        while str(number) in self.accounts:
+            number = 10_000_000 + (number - 10_000_000 + 1) % 90_000_000
+        account_number = str(number)
         self.accounts[account_number] = BankAccount(account_number, account_holder, encryption_manager=self.encryption_manager)
-        self.save_accounts()  # Save the newly created account
+        self.log_change(self.accounts[account_number])  # Journal the newly created account
         print(f"Account created successfully. Account Number: {account_number}")
 
     # Find an account by its account number
@@ -194,7 +363,7 @@ class BankSystem:
                 if account:
                     amount = float(input("Enter amount to deposit: "))
                     account.deposit(amount)
-                    self.save_accounts()  # Save after depositing
+                    self.log_change(account)  # Journal the deposit
                 else:
                     print("Account not found.")
 
@@ -204,7 +373,7 @@ class BankSystem:
                 if account:
                     amount = float(input("Enter amount to withdraw: "))
                     account.withdraw(amount)
-                    self.save_accounts()  # Save after withdrawing
+                    self.log_change(account)  # Journal the withdrawal
                 else:
                     print("Account not found.")
 
@@ -217,7 +386,7 @@ class BankSystem:
                     if target_account:
                         amount = float(input("Enter amount to transfer: "))
                         source_account.transfer(target_account, amount)
-                        self.save_accounts()  # Save after transferring
+                        self.log_change(source_account, target_account)  # Journal both sides of the transfer
                     else:
                         print("Target account not found.")
                 else:
@@ -232,6 +401,10 @@ class BankSystem:
                     print("Account not found.")
 
             elif choice == "6":
+                self._stop_flush.set()  # Stop the background flusher before the final write
+                self._flusher.join()
+                self.compact()  # Fold the journal into a fresh snapshot on clean exit
+                self._journal.close()
                 print("Goodbye!")
                 break
 